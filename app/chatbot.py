@@ -1,68 +1,190 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+import threading
+import time
 import requests
+import tiktoken
 from openai import OpenAI
 from app.config import settings
 from app.vector_store import get_vector_store
+from app.scheduler import llm_scheduler, SchedulerOverloaded
 
 class NeoRAGChatbot:
     def __init__(self):
         self.conversations = {}  # Store conversation history by session_id
+        self.session_namespaces = {}  # Collection each session is pinned to
+        self.summaries = {}  # Running summary of compacted turns by session_id
+        self._compacting = set()  # Sessions with a compaction in progress
+        self.prefetched = {}  # Speculative search results by session_id
+        self._prefetch_generation = {}  # Bumped to cancel in-flight prefetches
+        self._last_prefetch = {}  # Last prefetch start time by session_id
+        self._next_prefetch_sweep = 0.0
+        self._lock = threading.Lock()
+        self.encoder = tiktoken.get_encoding("cl100k_base")
+        self.llm_model = "gpt-4o"
+        # Built once so every request sends a byte-identical, cacheable prefix
+        self.system_prompt = self._create_system_prompt()
         # Use OpenRouter for LLM calls
         self.openai_client = OpenAI(
             api_key=settings.OPENROUTER_API_KEY,
             base_url="https://openrouter.ai/api/v1"
         )
 
-    def chat(self, message: str, session_id: str = "default") -> Dict[str, Any]:
+    def chat(self, message: str, session_id: str = "default", namespace: Optional[str] = None) -> Dict[str, Any]:
         """
         Main chat method with RAG
+        Passing a namespace pins the session to that collection for later turns.
+        Raises SchedulerOverloaded when upstream capacity is exhausted.
         Returns: {
             'response': str,
             'sources': List[Dict],
             'confidence': str
         }
         """
+        with llm_scheduler.session(session_id):
+            return self._chat(message, session_id, namespace)
+
+    def _chat(self, message: str, session_id: str, namespace: Optional[str]) -> Dict[str, Any]:
         # Get or create conversation history
         if session_id not in self.conversations:
             self.conversations[session_id] = []
 
-        # Search for relevant context
-        vector_store = get_vector_store()
-        search_results = vector_store.search(message, top_k=5)
+        # Pin the session to a collection, or reuse the pinned one
+        if namespace is not None:
+            self.session_namespaces[session_id] = namespace
+        namespace = self.session_namespaces.get(session_id)
+
+        # Reuse results prefetched while the user was typing, else search now
+        search_results = self._take_prefetched(session_id, message, namespace)
+        if search_results is None:
+            vector_store = get_vector_store()
+            search_results = vector_store.search(message, top_k=settings.TOP_K_RESULTS, namespace=namespace)
 
         # Build context from search results
         context = self._build_context(search_results)
 
-        # Build conversation history
-        conversation_history = self._build_history(session_id)
-
-        # Create prompt
-        system_prompt = self._create_system_prompt()
-        user_prompt = self._create_user_prompt(message, context, conversation_history)
+        # Create prompt: stable prefix (system, summary, history) then the new turn
+        messages = self._build_messages(session_id, message, context)
 
         # Call LLM via OpenRouter
-        response = self._call_llm(system_prompt, user_prompt)
+        response = self._call_llm(messages)
 
         # Store in conversation history
-        self.conversations[session_id].append({
-            'role': 'user',
-            'content': message
-        })
-        self.conversations[session_id].append({
-            'role': 'assistant',
-            'content': response
-        })
-
-        # Limit history to last 10 exchanges
-        if len(self.conversations[session_id]) > 20:
-            self.conversations[session_id] = self.conversations[session_id][-20:]
+        with self._lock:
+            history = self.conversations.setdefault(session_id, [])
+            history.append({
+                'role': 'user',
+                'content': message
+            })
+            history.append({
+                'role': 'assistant',
+                'content': response
+            })
+
+            # Hard limit in case compaction keeps failing
+            if len(history) > 20:
+                self.conversations[session_id] = history[-20:]
+
+        # Fold older turns into the summary once history gets too long
+        self._maybe_compact(session_id)
 
         return {
             'response': response,
             'sources': self._format_sources(search_results),
-            'session_id': session_id
+            'session_id': session_id,
+            'namespace': namespace
         }
 
+    def prefetch(self, message: str, session_id: str = "default", namespace: Optional[str] = None) -> str:
+        """
+        Speculatively run retrieval for a partially typed message.
+        A namespace pins the session the same way chat() does.
+        Returns a status: 'prefetched', 'cached', 'skipped', 'rate_limited' or 'cancelled'.
+        """
+        text = message.strip()
+        if len(text) < settings.PREFETCH_MIN_CHARS:
+            return 'skipped'
+
+        now = time.monotonic()
+        with self._lock:
+            self._evict_stale_prefetches(now)
+            if namespace is not None:
+                self.session_namespaces[session_id] = namespace
+
+            if now - self._last_prefetch.get(session_id, 0.0) < settings.PREFETCH_MIN_INTERVAL:
+                return 'rate_limited'
+            self._last_prefetch[session_id] = now
+
+            entry = self.prefetched.get(session_id)
+            namespace = self.session_namespaces.get(session_id)
+            if entry and entry['text'] == text and entry['namespace'] == namespace and entry['expires_at'] > now:
+                return 'cached'
+
+            generation = self._prefetch_generation.get(session_id, 0) + 1
+            self._prefetch_generation[session_id] = generation
+
+        # Never queue or take the last free slot for speculative work
+        if not llm_scheduler.has_capacity(headroom=1):
+            return 'skipped'
+
+        try:
+            with llm_scheduler.session(session_id):
+                results = get_vector_store().search(
+                    text, top_k=settings.TOP_K_RESULTS, namespace=namespace, blocking=False
+                )
+        except SchedulerOverloaded:
+            return 'skipped'
+
+        with self._lock:
+            # A newer prefetch, a sent message or a cancel superseded this one
+            if self._prefetch_generation.get(session_id) != generation:
+                return 'cancelled'
+            self.prefetched[session_id] = {
+                'text': text,
+                'namespace': namespace,
+                'results': results,
+                'expires_at': time.monotonic() + settings.PREFETCH_TTL
+            }
+        return 'prefetched'
+
+    def _evict_stale_prefetches(self, now: float):
+        """Drop per-session prefetch state idle for longer than the TTL. Caller holds the lock."""
+        if now < self._next_prefetch_sweep:
+            return
+        self._next_prefetch_sweep = now + settings.PREFETCH_TTL
+
+        for session_id in list(self._prefetch_generation):
+            entry = self.prefetched.get(session_id)
+            if entry and entry['expires_at'] > now:
+                continue
+            if now - self._last_prefetch.get(session_id, 0.0) < settings.PREFETCH_TTL:
+                continue
+            self.prefetched.pop(session_id, None)
+            self._prefetch_generation.pop(session_id, None)
+            self._last_prefetch.pop(session_id, None)
+
+    def cancel_prefetch(self, session_id: str):
+        """Drop cached results and discard any in-flight prefetch for a session"""
+        with self._lock:
+            self._prefetch_generation[session_id] = self._prefetch_generation.get(session_id, 0) + 1
+            self.prefetched.pop(session_id, None)
+
+    def _take_prefetched(self, session_id: str, message: str, namespace: Optional[str]) -> Optional[List[Dict[str, Any]]]:
+        """Return prefetched results if the final message matches or closely extends the prefetched text"""
+        with self._lock:
+            self._prefetch_generation[session_id] = self._prefetch_generation.get(session_id, 0) + 1
+            entry = self.prefetched.pop(session_id, None)
+
+        if not entry or entry['expires_at'] < time.monotonic() or entry['namespace'] != namespace:
+            return None
+
+        prefetched_text = " ".join(entry['text'].lower().split())
+        final_text = " ".join(message.lower().split())
+        if final_text == prefetched_text:
+            return entry['results']
+        if final_text.startswith(prefetched_text) and len(prefetched_text) >= settings.PREFETCH_MATCH_RATIO * len(final_text):
+            return entry['results']
+        return None
+
     def _build_context(self, search_results: List[Dict[str, Any]]) -> str:
         """Build context string from search results"""
         if not search_results:
@@ -78,17 +200,125 @@ class NeoRAGChatbot:
 
         return "\n".join(context_parts)
 
-    def _build_history(self, session_id: str) -> str:
-        """Build conversation history string"""
-        if session_id not in self.conversations or not self.conversations[session_id]:
-            return ""
+    def _build_history(self, session_id: str) -> List[Dict[str, str]]:
+        """Build conversation history as role messages"""
+        return [
+            {'role': msg['role'], 'content': msg['content']}
+            for msg in self.conversations.get(session_id, [])
+        ]
+
+    def _build_messages(self, session_id: str, message: str, context: str) -> List[Dict[str, Any]]:
+        """
+        Lay out messages so everything before the new turn is a stable prefix.
+
+        History only grows by appending between compactions, so the provider
+        can reuse its cached prefix; retrieved context changes every turn and
+        goes last.
+        """
+        messages = [self._cacheable_message('system', self.system_prompt)]
+
+        summary = self.summaries.get(session_id)
+        if summary:
+            messages.append({'role': 'system', 'content': f"Summary of the earlier conversation:\n{summary}"})
+
+        history = self._build_history(session_id)
+        if history:
+            history[-1] = self._cacheable_message(history[-1]['role'], history[-1]['content'])
+        messages.extend(history)
+
+        messages.append({'role': 'user', 'content': self._create_user_prompt(message, context)})
+        return messages
+
+    def _cacheable_message(self, role: str, content: str) -> Dict[str, Any]:
+        """
+        Mark a prompt-cache breakpoint for Anthropic models. OpenAI models such
+        as gpt-4o cache long identical prefixes automatically, so they get
+        plain messages and rely on the stable layout from _build_messages.
+        """
+        if not self.llm_model.startswith("anthropic/"):
+            return {'role': role, 'content': content}
+        return {
+            'role': role,
+            'content': [{'type': 'text', 'text': content, 'cache_control': {'type': 'ephemeral'}}]
+        }
 
-        history_parts = []
-        for msg in self.conversations[session_id][-6:]:  # Last 3 exchanges
-            role = "User" if msg['role'] == 'user' else "Assistant"
-            history_parts.append(f"{role}: {msg['content']}")
+    def _count_tokens(self, messages: List[Dict[str, str]]) -> int:
+        return sum(len(self.encoder.encode(msg['content'])) for msg in messages)
 
-        return "\n".join(history_parts)
+    def _maybe_compact(self, session_id: str):
+        """
+        Start a background compaction if the session history is over budget.
+
+        Compaction folds down to HISTORY_TARGET_TOKENS, well below the budget,
+        so the next few turns append to an unchanged prefix instead of
+        triggering a summary (and a new cache prefix) every turn.
+        """
+        history = self.conversations.get(session_id, [])
+        if len(history) <= settings.HISTORY_KEEP_MESSAGES:
+            return
+        if self._count_tokens(history) <= settings.HISTORY_TOKEN_BUDGET:
+            return
+
+        with self._lock:
+            if session_id in self._compacting:
+                return
+            self._compacting.add(session_id)
+
+        threading.Thread(target=self._compact_history, args=(session_id,), daemon=True).start()
+
+    def _fold_count(self, history: List[Dict[str, str]]) -> int:
+        """Number of oldest messages to fold so the rest fits the compaction target"""
+        max_fold = len(history) - settings.HISTORY_KEEP_MESSAGES
+        fold_count = 0
+        remaining = self._count_tokens(history)
+        # Fold whole exchanges (user + assistant) from the oldest end
+        while fold_count + 2 <= max_fold and remaining > settings.HISTORY_TARGET_TOKENS:
+            remaining -= self._count_tokens(history[fold_count:fold_count + 2])
+            fold_count += 2
+        return fold_count
+
+    def _compact_history(self, session_id: str):
+        """Roll the oldest turns into the running summary until history is under target"""
+        try:
+            history = list(self.conversations.get(session_id, []))
+            fold_count = self._fold_count(history)
+            if fold_count <= 0:
+                return
+
+            with llm_scheduler.session(session_id):
+                summary = self._summarize(self.summaries.get(session_id), history[:fold_count])
+
+            with self._lock:
+                # Skip if the session was cleared or trimmed while we were summarizing
+                current = self.conversations.get(session_id)
+                if current is None or current[:fold_count] != history[:fold_count]:
+                    return
+                self.summaries[session_id] = summary
+                self.conversations[session_id] = current[fold_count:]
+        except Exception as e:
+            print(f"Error compacting history for {session_id}: {e}")
+        finally:
+            with self._lock:
+                self._compacting.discard(session_id)
+
+    def _summarize(self, previous_summary: Optional[str], turns: List[Dict[str, str]]) -> str:
+        """Merge older turns into a short running summary"""
+        transcript = "\n".join(
+            f"{'User' if msg['role'] == 'user' else 'Assistant'}: {msg['content']}" for msg in turns
+        )
+        prompt_parts = []
+        if previous_summary:
+            prompt_parts.append(f"Existing summary:\n{previous_summary}\n")
+        prompt_parts.append(f"New conversation turns:\n{transcript}\n")
+        prompt_parts.append("""Update the summary of this conversation between a user and Neo Assistant.
+Keep the user's goals, their setup details, questions asked and key facts from the answers.
+Be concise - a few short bullet points.""")
+
+        return self._complete(
+            [{'role': 'user', 'content': "\n".join(prompt_parts)}],
+            temperature=0.2,
+            max_tokens=settings.SUMMARY_MAX_TOKENS
+        )
 
     def _create_system_prompt(self) -> str:
         """Create system prompt for the chatbot"""
@@ -133,13 +363,9 @@ Help people figure out if their workflow ideas are doable with Neo by showing th
 
 Be the friendly expert they want to grab coffee with!"""
 
-    def _create_user_prompt(self, message: str, context: str, history: str) -> str:
-        """Create the full user prompt with context"""
+    def _create_user_prompt(self, message: str, context: str) -> str:
+        """Create the user prompt for the new turn with retrieved context"""
         prompt_parts = []
-
-        if history:
-            prompt_parts.append(f"Previous conversation:\n{history}\n")
-
         prompt_parts.append(f"Relevant documentation:\n{context}\n")
         prompt_parts.append(f"User question: {message}\n")
         prompt_parts.append("""Please answer the question based on the documentation provided.
@@ -148,19 +374,24 @@ Format your response in a friendly, conversational way.""")
 
         return "\n".join(prompt_parts)
 
-    def _call_llm(self, system_prompt: str, user_prompt: str) -> str:
-        """Call OpenAI API with GPT-4o"""
-        try:
+    def _complete(self, messages: List[Dict[str, Any]], temperature: float = 0.7, max_tokens: int = 1000) -> str:
+        """Run a chat completion through the scheduler. Raises on failure."""
+        with llm_scheduler.slot():
             response = self.openai_client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0.7,
-                max_tokens=1000
+                model=self.llm_model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens
             )
             return response.choices[0].message.content
+
+    def _call_llm(self, messages: List[Dict[str, Any]]) -> str:
+        """Call OpenAI API with GPT-4o"""
+        try:
+            return self._complete(messages)
+        except SchedulerOverloaded:
+            # Overload is surfaced to the API as a 429, not turned into a reply
+            raise
         except Exception as e:
             return f"Error calling LLM: {str(e)}"
 
@@ -177,8 +408,11 @@ Format your response in a friendly, conversational way.""")
 
     def clear_conversation(self, session_id: str):
         """Clear conversation history for a session"""
-        if session_id in self.conversations:
-            del self.conversations[session_id]
+        with self._lock:
+            self.conversations.pop(session_id, None)
+            self.session_namespaces.pop(session_id, None)
+            self.summaries.pop(session_id, None)
+        self.cancel_prefetch(session_id)
 
 # Global instance
 chatbot = NeoRAGChatbot()
@@ -15,14 +15,48 @@ class Settings:
     # Pinecone
     PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME", "neo-knowledge")
     PINECONE_ENVIRONMENT = os.getenv("PINECONE_ENVIRONMENT", "gcp-starter")
+    # Collection used when no namespace is given ("" is Pinecone's default namespace)
+    PINECONE_NAMESPACE = os.getenv("PINECONE_NAMESPACE", "")
 
     # Models
     EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
     LLM_MODEL = os.getenv("LLM_MODEL", "anthropic/claude-3.5-sonnet")
+    # text-embedding-3-* models can return shortened embeddings (e.g. 512 or 256)
+    EMBEDDING_DIMENSION = int(os.getenv("EMBEDDING_DIMENSION", "1536"))
+    # Chunks embedded per API request
+    EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+
+    # Local quantized search ("int8" = 4x smaller, "binary" = 32x smaller)
+    VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "int8")
+    RESCORE_FACTOR = int(os.getenv("RESCORE_FACTOR", "4"))
+    # Serve unfiltered searches from a cached in-process quantized index
+    LOCAL_VECTOR_SEARCH = os.getenv("LOCAL_VECTOR_SEARCH", "false").lower() == "true"
+    LOCAL_INDEX_MAX_AGE = float(os.getenv("LOCAL_INDEX_MAX_AGE", "300"))  # seconds before a rebuild
+
+    # Upstream concurrency (chat completions + embeddings)
+    LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+    LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "32"))
+    LLM_MAX_QUEUE_PER_SESSION = int(os.getenv("LLM_MAX_QUEUE_PER_SESSION", "4"))
+    LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "15"))  # seconds
+
+    # Speculative retrieval while the user is typing
+    PREFETCH_TTL = float(os.getenv("PREFETCH_TTL", "30"))  # seconds a prefetch stays reusable
+    PREFETCH_MIN_INTERVAL = float(os.getenv("PREFETCH_MIN_INTERVAL", "0.5"))  # per session
+    PREFETCH_MIN_CHARS = 12
+    PREFETCH_MATCH_RATIO = 0.8  # prefetched text must cover this share of the final message
 
     # RAG Settings
-    CHUNK_SIZE = 1000
-    CHUNK_OVERLAP = 200
-    TOP_K_RESULTS = 5
+    # Chunk size and overlap are measured in tokens (cl100k_base)
+    CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "2000"))
+    CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "100"))
+    TOP_K_RESULTS = int(os.getenv("TOP_K_RESULTS", "5"))
+
+    # Conversation history: once it exceeds HISTORY_TOKEN_BUDGET tokens, the
+    # oldest turns are folded into a running summary until it fits in
+    # HISTORY_TARGET_TOKENS, always keeping the last HISTORY_KEEP_MESSAGES messages
+    HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1500"))
+    HISTORY_TARGET_TOKENS = int(os.getenv("HISTORY_TARGET_TOKENS", str(HISTORY_TOKEN_BUDGET // 2)))
+    HISTORY_KEEP_MESSAGES = int(os.getenv("HISTORY_KEEP_MESSAGES", "4"))
+    SUMMARY_MAX_TOKENS = int(os.getenv("SUMMARY_MAX_TOKENS", "300"))
 
 settings = Settings()
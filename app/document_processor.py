@@ -5,11 +5,15 @@ import markdown
 from pypdf import PdfReader
 import tiktoken
 
+# File extensions accepted for ingestion
+SUPPORTED_EXTENSIONS = ['.md', '.txt', '.pdf']
+
 class DocumentProcessor:
-    def __init__(self):
+    def __init__(self, max_tokens: int = None, overlap_tokens: int = None):
         # Use token-based chunking instead of character-based
-        self.max_tokens = 2000  # Safe limit for embedding (well under 8192)
-        self.overlap_tokens = 100
+        # Default 2000 is a safe limit for embedding (well under 8192)
+        self.max_tokens = max_tokens if max_tokens is not None else settings.CHUNK_SIZE
+        self.overlap_tokens = overlap_tokens if overlap_tokens is not None else settings.CHUNK_OVERLAP
         # Use cl100k_base encoding (same as GPT-4 and text-embedding-3-small)
         self.encoder = tiktoken.get_encoding("cl100k_base")
 
@@ -0,0 +1,251 @@
+"""
+Bulk ingestion CLI.
+
+Walks a directory or .zip archive, chunks files in a process pool, embeds
+chunks in batches that span files, and upserts them to Pinecone. Finished
+files are recorded in a checkpoint manifest so an interrupted run resumes
+where it left off.
+
+Usage:
+    python -m app.ingest docs/ --namespace shell --workers 8
+    python -m app.ingest knowledge.zip --manifest knowledge.manifest.json
+"""
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Dict, Any, Tuple
+
+from app.config import settings
+from app.document_processor import SUPPORTED_EXTENSIONS
+
+# Attempts per embedding batch before its files are marked failed
+EMBED_ATTEMPTS = 3
+EMBED_RETRY_DELAY = 2.0  # seconds, doubled after each failed attempt
+
+
+def _file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _process_file(path: str, document_name: str) -> Tuple[str, str, List[Dict[str, Any]]]:
+    """Worker: hash and chunk one file. Runs in a separate process."""
+    from app.document_processor import document_processor
+
+    file_type = os.path.splitext(path)[1].lower()[1:]
+    chunks = document_processor.process_and_chunk(path, file_type, document_name)
+    return document_name, _file_sha256(Path(path)), chunks
+
+
+def _extract_zip(archive: Path, target: Path) -> Path:
+    """Extract an archive, skipping entries that would escape the target directory"""
+    target = target.resolve()
+    with zipfile.ZipFile(archive) as zf:
+        for member in zf.infolist():
+            destination = (target / member.filename).resolve()
+            if not str(destination).startswith(str(target) + os.sep):
+                print(f"Skipping unsafe archive entry: {member.filename}")
+                continue
+            zf.extract(member, target)
+    return target
+
+
+def collect_files(root: Path) -> List[Tuple[Path, str]]:
+    """Return (path, document_name) for every supported file under root"""
+    files = []
+    for path in sorted(root.rglob('*')):
+        if path.is_file() and path.suffix.lower() in SUPPORTED_EXTENSIONS:
+            files.append((path, path.relative_to(root).as_posix()))
+    return files
+
+
+class Manifest:
+    """Checkpoint of fully ingested files, keyed by document name"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if path.exists():
+            with open(path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+
+    def is_done(self, document_name: str, sha256: str, namespace: str) -> bool:
+        entry = self.entries.get(document_name)
+        return bool(entry) and entry['sha256'] == sha256 and entry['namespace'] == namespace
+
+    def mark_done(self, document_name: str, sha256: str, namespace: str, chunks: int):
+        self.entries[document_name] = {
+            'sha256': sha256,
+            'namespace': namespace,
+            'chunks': chunks,
+            'completed_at': datetime.now(timezone.utc).isoformat()
+        }
+        # Write atomically so a crash never leaves a truncated manifest
+        temp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, indent=2)
+        os.replace(temp_path, self.path)
+
+
+def ingest(
+    source: Path,
+    namespace: str,
+    manifest_path: Path,
+    workers: int,
+    batch_size: int,
+    embed_concurrency: int
+) -> Dict[str, Any]:
+    """Ingest every supported file under source (directory or .zip)"""
+    from app.vector_store import get_vector_store
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        root = _extract_zip(source, Path(temp_dir)) if zipfile.is_zipfile(source) else source
+        files = collect_files(root)
+
+        manifest = Manifest(manifest_path)
+        todo = []
+        for path, document_name in files:
+            if manifest.is_done(document_name, _file_sha256(path), namespace):
+                continue
+            todo.append((path, document_name))
+
+        print(f"Found {len(files)} files, {len(files) - len(todo)} already ingested, {len(todo)} to process")
+        if not todo:
+            return {'files': 0, 'chunks': 0, 'failed': 0, 'seconds': 0.0}
+
+        # --embed-concurrency bounds upstream calls; the web scheduler's per-session
+        # queue limits would shed most of this process's batches
+        vector_store = get_vector_store(scheduled=False)
+        ingested_at = int(time.time())
+        start_time = time.time()
+
+        remaining = {}  # document_name -> chunks not yet upserted
+        hashes = {}
+        totals = {}
+        buffer = []  # (document_name, chunk_index, chunk) waiting for embedding
+        failed_files = set()
+        files_done = chunks_done = 0
+
+        def embed_and_upsert(batch):
+            delay = EMBED_RETRY_DELAY
+            for attempt in range(1, EMBED_ATTEMPTS + 1):
+                try:
+                    embeddings = vector_store.create_embeddings([chunk['text'] for _, _, chunk in batch])
+                    vectors = [
+                        vector_store.build_vector(chunk, document_name, chunk_index, embedding, ingested_at)
+                        for (document_name, chunk_index, chunk), embedding in zip(batch, embeddings)
+                    ]
+                    vector_store.upsert_vectors(vectors, namespace)
+                    return
+                except Exception as e:
+                    if attempt == EMBED_ATTEMPTS:
+                        raise
+                    print(f"Embedding batch failed (attempt {attempt}/{EMBED_ATTEMPTS}), retrying in {delay:.0f}s: {e}")
+                    time.sleep(delay)
+                    delay *= 2
+
+        def fail_file(document_name, error):
+            # Leave the file out of the manifest so the next run retries it
+            if document_name not in failed_files:
+                print(f"ERROR ingesting {document_name}: {error}")
+                failed_files.add(document_name)
+
+        def finish_file(document_name):
+            nonlocal files_done
+            manifest.mark_done(document_name, hashes[document_name], namespace, totals[document_name])
+            files_done += 1
+
+        def report():
+            elapsed = max(time.time() - start_time, 1e-6)
+            print(f"[{files_done}/{len(todo)} files] {chunks_done} chunks | "
+                  f"{files_done / elapsed:.2f} files/s, {chunks_done / elapsed:.1f} chunks/s")
+
+        with ProcessPoolExecutor(max_workers=workers) as process_pool, \
+                ThreadPoolExecutor(max_workers=embed_concurrency) as embed_pool:
+            # future -> document name / batch, so failures can be attributed to files
+            chunking = {process_pool.submit(_process_file, str(path), name): name for path, name in todo}
+            embedding = {}
+
+            while chunking or embedding or buffer:
+                # Flush full batches, keeping a bounded number in flight
+                while len(buffer) >= batch_size and len(embedding) < embed_concurrency * 2:
+                    batch, buffer = buffer[:batch_size], buffer[batch_size:]
+                    embedding[embed_pool.submit(embed_and_upsert, batch)] = batch
+
+                # Once all files are chunked, flush the partial batch
+                if buffer and not chunking and len(embedding) < embed_concurrency * 2:
+                    embedding[embed_pool.submit(embed_and_upsert, buffer)] = buffer
+                    buffer = []
+
+                if not chunking and not embedding:
+                    continue
+
+                done, _ = wait(set(chunking) | set(embedding), return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in chunking:
+                        document_name = chunking.pop(future)
+                        try:
+                            _, sha256, chunks = future.result()
+                        except Exception as e:
+                            fail_file(document_name, e)
+                            continue
+                        hashes[document_name] = sha256
+                        totals[document_name] = len(chunks)
+                        remaining[document_name] = len(chunks)
+                        buffer.extend((document_name, i, chunk) for i, chunk in enumerate(chunks))
+                        if not chunks:
+                            finish_file(document_name)
+                    else:
+                        batch = embedding.pop(future)
+                        error = future.exception()
+                        if error is not None:
+                            for document_name in {name for name, _, _ in batch}:
+                                fail_file(document_name, error)
+                            # Drop queued chunks of failed files; they are redone on the next run
+                            buffer = [item for item in buffer if item[0] not in failed_files]
+                            continue
+
+                        for document_name, _, _ in batch:
+                            remaining[document_name] -= 1
+                            chunks_done += 1
+                            if remaining[document_name] == 0 and document_name not in failed_files:
+                                finish_file(document_name)
+                        report()
+
+        elapsed = time.time() - start_time
+        report()
+        return {'files': files_done, 'chunks': chunks_done, 'failed': len(failed_files), 'seconds': round(elapsed, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-ingest a directory or .zip archive into the knowledge base")
+    parser.add_argument('source', help="Directory or .zip archive to ingest")
+    parser.add_argument('--namespace', default=settings.PINECONE_NAMESPACE, help="Target collection namespace")
+    parser.add_argument('--manifest', help="Checkpoint manifest path (default: <source>.manifest.json)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Processes used for chunking")
+    parser.add_argument('--batch-size', type=int, default=settings.EMBEDDING_BATCH_SIZE, help="Chunks per embedding request")
+    parser.add_argument('--embed-concurrency', type=int, default=4, help="Concurrent embedding/upsert requests")
+    args = parser.parse_args()
+
+    source = Path(args.source)
+    if not source.exists():
+        parser.error(f"{source} does not exist")
+    manifest_path = Path(args.manifest) if args.manifest else Path(str(source).rstrip('/\\') + '.manifest.json')
+
+    summary = ingest(source, args.namespace, manifest_path, args.workers, args.batch_size, args.embed_concurrency)
+    print(f"Done: {summary['files']} files, {summary['chunks']} chunks in {summary['seconds']}s "
+          f"({summary['failed']} failed)")
+
+
+if __name__ == "__main__":
+    main()
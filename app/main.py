@@ -1,19 +1,39 @@
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, JSONResponse, FileResponse
+from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
+from anyio import to_thread
 from pydantic import BaseModel
 from typing import Optional
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+import math
 import os
 import shutil
 from pathlib import Path
 
 from app.config import settings
-from app.vector_store import get_vector_store
-from app.document_processor import document_processor
+from app.vector_store import get_vector_store, build_metadata_filter
+from app.document_processor import document_processor, SUPPORTED_EXTENSIONS
 from app.chatbot import chatbot
+from app.scheduler import llm_scheduler, SchedulerOverloaded
+from app.static_assets import StaticAssets
 
-app = FastAPI(title="Neo RAG Chatbot")
+# Worker threads beyond queued + in-flight upstream calls, for requests that don't wait on the scheduler
+WORKER_THREAD_HEADROOM = 16
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Threads parked in the scheduler queue must not exhaust the worker pool,
+    # or new requests wait for a thread instead of getting an early 429
+    limiter = to_thread.current_default_thread_limiter()
+    limiter.total_tokens = max(
+        limiter.total_tokens,
+        settings.LLM_MAX_QUEUE + settings.LLM_MAX_CONCURRENCY + WORKER_THREAD_HEADROOM
+    )
+    yield
+
+app = FastAPI(title="Neo RAG Chatbot", lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -24,10 +44,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Shed requests with 429 when upstream capacity is exhausted
+@app.exception_handler(SchedulerOverloaded)
+async def overloaded_handler(request: Request, exc: SchedulerOverloaded):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": exc.reason},
+        headers={"Retry-After": str(math.ceil(exc.retry_after))}
+    )
+
 # Get base directory
 BASE_DIR = Path(__file__).resolve().parent.parent
 STATIC_DIR = BASE_DIR / "static"
 
+# Hashed, precompressed UI assets (built into static/dist if missing or stale)
+static_assets = StaticAssets(STATIC_DIR, STATIC_DIR / "dist")
+static_assets.load()
+
 # Create uploads directory
 UPLOAD_DIR = Path("uploads")
 UPLOAD_DIR.mkdir(exist_ok=True)
@@ -36,33 +69,65 @@ UPLOAD_DIR.mkdir(exist_ok=True)
 class ChatRequest(BaseModel):
     message: str
     session_id: Optional[str] = "default"
+    namespace: Optional[str] = None  # Pins the session to a collection
+
+class PrefetchRequest(BaseModel):
+    message: str
+    session_id: Optional[str] = "default"
+    namespace: Optional[str] = None  # Pins the session to a collection, as in ChatRequest
 
 class ChatResponse(BaseModel):
     response: str
     sources: list
     session_id: str
+    namespace: Optional[str] = None
 
 # Landing page
 @app.get("/", response_class=HTMLResponse)
-async def landing_page():
+async def landing_page(request: Request):
     """Serve the landing page"""
-    return FileResponse(STATIC_DIR / "index.html")
+    return static_assets.html(request, "index.html")
 
 # Health check API
 @app.get("/api/health")
 async def health_check():
-    return {"status": "ok", "message": "Neo RAG Chatbot API"}
+    return {"status": "ok", "message": "Neo RAG Chatbot API", "scheduler": llm_scheduler.stats()}
 
 # Chat endpoint
 @app.post("/api/chat", response_model=ChatResponse)
 async def chat_endpoint(request: ChatRequest):
     """Main chat endpoint"""
     try:
-        result = chatbot.chat(request.message, request.session_id)
+        # Shed with 429 before taking a worker thread if the queue is already full
+        llm_scheduler.check_admission(request.session_id)
+        # Run in a worker thread so concurrent chats don't block the event loop
+        result = await run_in_threadpool(chatbot.chat, request.message, request.session_id, request.namespace)
         return ChatResponse(**result)
+    except SchedulerOverloaded:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Speculative retrieval while the user is typing
+@app.post("/api/prefetch")
+async def prefetch_endpoint(request: PrefetchRequest):
+    """Prefetch search results for a partially typed message"""
+    try:
+        status = await run_in_threadpool(
+            chatbot.prefetch, request.message, request.session_id, request.namespace
+        )
+        return {"status": status}
+    except Exception as e:
+        # Prefetch is best-effort; never surface errors to the typing user
+        print(f"Prefetch error: {e}")
+        return {"status": "error"}
+
+@app.delete("/api/prefetch/{session_id}")
+async def cancel_prefetch(session_id: str):
+    """Discard prefetched results for a session"""
+    chatbot.cancel_prefetch(session_id)
+    return {"status": "ok"}
+
 # Clear conversation
 @app.post("/api/clear/{session_id}")
 async def clear_conversation(session_id: str):
@@ -75,7 +140,8 @@ async def clear_conversation(session_id: str):
 async def upload_document(
     file: UploadFile = File(...),
     password: str = Form(...),
-    document_name: Optional[str] = Form(None)
+    document_name: Optional[str] = Form(None),
+    namespace: Optional[str] = Form(None)
 ):
     """Upload and process a document (admin only)"""
     # Verify password
@@ -83,7 +149,7 @@ async def upload_document(
         raise HTTPException(status_code=403, detail="Invalid admin password")
 
     # Validate file type
-    allowed_extensions = ['.md', '.txt', '.pdf']
+    allowed_extensions = SUPPORTED_EXTENSIONS
     file_ext = os.path.splitext(file.filename)[1].lower()
 
     if file_ext not in allowed_extensions:
@@ -99,22 +165,26 @@ async def upload_document(
     else:
         doc_name = file.filename
 
+    # Embedding the chunks needs upstream capacity; shed early rather than after chunking
+    llm_scheduler.check_admission()
+
     # Save file temporarily
     temp_path = UPLOAD_DIR / file.filename
     try:
         with open(temp_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+            await run_in_threadpool(shutil.copyfileobj, file.file, buffer)
 
-        # Process and add to vector store
-        chunks = document_processor.process_and_chunk(
+        # Process and add to vector store (off the event loop: chunking and embedding block)
+        chunks = await run_in_threadpool(
+            document_processor.process_and_chunk,
             str(temp_path),
             file_ext[1:],  # Remove the dot
             doc_name
         )
 
         # Add to Pinecone
-        vector_store = get_vector_store()
-        num_chunks = vector_store.add_documents(chunks, doc_name)
+        vector_store = await run_in_threadpool(get_vector_store)
+        num_chunks = await run_in_threadpool(vector_store.add_documents, chunks, doc_name, namespace)
 
         # Clean up temp file
         os.remove(temp_path)
@@ -122,9 +192,15 @@ async def upload_document(
         return {
             "status": "success",
             "message": f"Document '{doc_name}' uploaded successfully",
-            "chunks_created": num_chunks
+            "chunks_created": num_chunks,
+            "namespace": namespace if namespace is not None else settings.PINECONE_NAMESPACE
         }
 
+    except SchedulerOverloaded:
+        # Embedding capacity is saturated; surfaces as 429 with Retry-After
+        if temp_path.exists():
+            os.remove(temp_path)
+        raise
     except Exception as e:
         # Clean up on error
         if temp_path.exists():
@@ -152,34 +228,78 @@ async def list_documents(password: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _parse_date(value: Optional[str], field: str, end_of_day: bool = False) -> Optional[int]:
+    """
+    Parse an ISO date/datetime query parameter into a Unix timestamp.
+
+    Values without a timezone are UTC. With end_of_day, a date-only value
+    means the last second of that day, so the bound includes the whole day.
+    """
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {field}: expected ISO date, got '{value}'")
+
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    if end_of_day and 'T' not in value and ' ' not in value.strip():
+        return int((parsed + timedelta(days=1)).timestamp()) - 1
+    return int(parsed.timestamp())
+
 # Search endpoint (for testing)
 @app.get("/api/search")
-async def search_endpoint(query: str, top_k: int = 5):
-    """Search the knowledge base"""
+async def search_endpoint(
+    query: str,
+    top_k: int = 5,
+    namespace: Optional[str] = None,
+    document_name: Optional[str] = None,
+    file_type: Optional[str] = None,
+    ingested_after: Optional[str] = None,
+    ingested_before: Optional[str] = None
+):
+    """Search the knowledge base, optionally scoped to a namespace and metadata filters"""
+    metadata_filter = build_metadata_filter(
+        document_name=document_name,
+        file_type=file_type,
+        ingested_after=_parse_date(ingested_after, 'ingested_after'),
+        ingested_before=_parse_date(ingested_before, 'ingested_before', end_of_day=True)
+    )
+
     try:
-        vector_store = get_vector_store()
-        results = vector_store.search(query, top_k)
+        llm_scheduler.check_admission()
+        # Connecting to the index makes blocking Pinecone calls too
+        vector_store = await run_in_threadpool(get_vector_store)
+        results = await run_in_threadpool(
+            vector_store.search, query, top_k, namespace=namespace, filter=metadata_filter
+        )
         return {
             "status": "success",
             "results": results
         }
+    except SchedulerOverloaded:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # Serve the main chat interface
 @app.get("/chat", response_class=HTMLResponse)
-async def chat_interface():
+async def chat_interface(request: Request):
     """Serve the chat interface"""
-    return FileResponse(STATIC_DIR / "chat.html")
+    return static_assets.html(request, "chat.html")
 
 # Serve the admin interface
 @app.get("/admin", response_class=HTMLResponse)
-async def admin_interface():
+async def admin_interface(request: Request):
     """Serve the admin interface"""
-    return FileResponse(STATIC_DIR / "admin.html")
+    return static_assets.html(request, "admin.html")
 
-# Serve static files (HTML/CSS/JS) - mount at the end
-app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
+# Serve static files (images, audio) - hashed names are cached forever
+@app.get("/static/{name}")
+async def static_file(request: Request, name: str):
+    """Serve a static asset"""
+    return static_assets.asset(request, name)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,261 @@
+import time
+from typing import List, Dict, Any, Callable, Optional
+import numpy as np
+
+# Supported quantization modes
+QUANTIZATION_MODES = ('int8', 'binary')
+
+# Rows scored per block: the int8 block and its float32 copy stay in CPU cache,
+# so the scan reads 1 byte per dimension from memory instead of 4
+SCORE_BLOCK_ROWS = 512
+
+_M1 = np.uint64(0x5555555555555555)
+_M2 = np.uint64(0x3333333333333333)
+_M4 = np.uint64(0x0f0f0f0f0f0f0f0f)
+_H01 = np.uint64(0x0101010101010101)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize rows so dot products are cosine similarities"""
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def quantize_int8(vectors: np.ndarray):
+    """Symmetric per-vector int8 quantization. Returns (codes, scales)"""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.round(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def quantize_binary(vectors: np.ndarray) -> np.ndarray:
+    """Sign-bit quantization packed into uint64 words (1 bit per dimension)"""
+    bits = np.packbits(vectors > 0, axis=1)
+    # Pad to whole 64-bit words; padding bits are zero on both sides of the XOR
+    padding = (-bits.shape[1]) % 8
+    if padding:
+        bits = np.pad(bits, ((0, 0), (0, padding)))
+    return np.ascontiguousarray(bits).view(np.uint64)
+
+
+def _hamming_distances(codes: np.ndarray, query_bits: np.ndarray, block_rows: int = 4096) -> np.ndarray:
+    """Hamming distance from query_bits to every row of codes (uint64 words)"""
+    distances = np.empty(len(codes), dtype=np.uint64)
+    words = np.empty((block_rows, codes.shape[1]), dtype=np.uint64)
+    shifted = np.empty_like(words)
+    for start in range(0, len(codes), block_rows):
+        block = codes[start:start + block_rows]
+        x, t = words[:len(block)], shifted[:len(block)]
+        # SWAR popcount of the XOR, in place on cache-sized blocks
+        np.bitwise_xor(block, query_bits, out=x)
+        np.right_shift(x, np.uint64(1), out=t)
+        t &= _M1
+        x -= t
+        np.right_shift(x, np.uint64(2), out=t)
+        t &= _M2
+        x &= _M2
+        x += t
+        np.right_shift(x, np.uint64(4), out=t)
+        x += t
+        x &= _M4
+        x *= _H01
+        x >>= np.uint64(56)
+        x.sum(axis=1, out=distances[start:start + len(block)])
+    return distances
+
+
+class QuantizedIndex:
+    """
+    Compact in-memory vector index for first-pass search.
+
+    Vectors are held as int8 codes (4x smaller than float32) or packed sign
+    bits (32x smaller). Search scans the codes, then rescores the best
+    candidates with exact float vectors fetched on demand.
+    """
+
+    def __init__(self, dimension: int, mode: str = 'int8'):
+        if mode not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown quantization mode '{mode}'. Allowed: {QUANTIZATION_MODES}")
+        self.dimension = dimension
+        self.mode = mode
+        # Only IDs and codes are kept; text and metadata come back with the rescoring fetch
+        self.ids: List[str] = []
+        self.codes = np.zeros((0, self._code_width()), dtype=self._code_dtype())
+        self.scales = np.zeros(0, dtype=np.float32)
+
+    def _code_width(self) -> int:
+        return self.dimension if self.mode == 'int8' else (self.dimension + 63) // 64
+
+    def _code_dtype(self):
+        return np.int8 if self.mode == 'int8' else np.uint64
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, ids: List[str], vectors):
+        """Quantize and append vectors to the index"""
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+        if vectors.shape[1] != self.dimension:
+            raise ValueError(f"Expected dimension {self.dimension}, got {vectors.shape[1]}")
+
+        if self.mode == 'int8':
+            codes, scales = quantize_int8(vectors)
+            self.scales = np.concatenate([self.scales, scales])
+        else:
+            codes = quantize_binary(vectors)
+
+        self.codes = np.concatenate([self.codes, codes])
+        self.ids.extend(ids)
+
+    def _approximate_scores(self, query: np.ndarray) -> np.ndarray:
+        """Score every stored vector against the query using the codes only"""
+        if self.mode == 'int8':
+            # Widen one cache-sized block at a time into a reused buffer. numpy has
+            # no int8 dot kernels, so this beats int32 accumulation and never
+            # materializes a float32 copy of the whole code matrix.
+            query = query.astype(np.float32)
+            scores = np.empty(len(self.codes), dtype=np.float32)
+            buffer = np.empty((SCORE_BLOCK_ROWS, self.dimension), dtype=np.float32)
+            for start in range(0, len(self.codes), SCORE_BLOCK_ROWS):
+                block = self.codes[start:start + SCORE_BLOCK_ROWS]
+                widened = buffer[:len(block)]
+                np.copyto(widened, block, casting='unsafe')
+                np.matmul(widened, query, out=scores[start:start + len(block)])
+            return scores * self.scales
+
+        # Hamming distance on sign bits, mapped to a similarity in [-1, 1]
+        query_bits = quantize_binary(query[None, :])[0]
+        hamming = _hamming_distances(self.codes, query_bits)
+        return 1.0 - 2.0 * hamming / self.dimension
+
+    def search(
+        self,
+        query_vector,
+        top_k: int = 5,
+        rescore_factor: int = 4,
+        fetch_vectors: Optional[Callable[[List[str]], Dict[str, Dict[str, Any]]]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Quantized first pass, then exact rescoring of the top candidates.
+
+        fetch_vectors maps a list of IDs to {id: {'values': [...], 'metadata': {...}}}.
+        Without it, the approximate scores are returned as-is with empty metadata.
+        """
+        if not self.ids:
+            return []
+
+        query = _normalize(np.asarray(query_vector, dtype=np.float32))
+        scores = self._approximate_scores(query)
+
+        num_candidates = min(len(self.ids), top_k * max(rescore_factor, 1))
+        candidates = np.argpartition(-scores, num_candidates - 1)[:num_candidates]
+
+        records = {}
+        if fetch_vectors is not None:
+            records = fetch_vectors([self.ids[i] for i in candidates])
+            rescored = []
+            for i in candidates:
+                record = records.get(self.ids[i])
+                if record is None:
+                    rescored.append(float(scores[i]))
+                else:
+                    values = np.asarray(record['values'], dtype=np.float32)
+                    rescored.append(float(_normalize(values) @ query))
+            candidate_scores = np.asarray(rescored)
+        else:
+            candidate_scores = scores[candidates]
+
+        order = np.argsort(-candidate_scores)[:top_k]
+        return [
+            {
+                'id': self.ids[candidates[j]],
+                'score': float(candidate_scores[j]),
+                'metadata': records.get(self.ids[candidates[j]], {}).get('metadata', {})
+            }
+            for j in order
+        ]
+
+    def memory_bytes(self) -> int:
+        """Bytes held by the vector codes (excluding IDs)"""
+        return int(self.codes.nbytes + self.scales.nbytes)
+
+    def compare(self, vectors, queries, top_k: int = 5, rescore_factor: int = 4) -> Dict[str, Any]:
+        """
+        Compare quantized search against exact float32 search.
+
+        vectors must be the full-precision vectors in the same order they were
+        added. queries should be held out of the index, otherwise every query
+        finds itself at rank 1 and recall is inflated. Reports recall@k with
+        and without rescoring, memory and latency.
+        """
+        full = _normalize(np.asarray(vectors, dtype=np.float32))
+        queries = _normalize(np.asarray(queries, dtype=np.float32))
+        lookup = {vector_id: full[i] for i, vector_id in enumerate(self.ids)}
+
+        def fetch(ids):
+            return {vector_id: {'values': lookup[vector_id]} for vector_id in ids}
+
+        exact_time = approx_time = rescored_time = 0.0
+        approx_hits = rescored_hits = 0
+
+        for query in queries:
+            start = time.perf_counter()
+            exact_scores = full @ query
+            k = min(top_k, len(exact_scores))
+            truth = set(self.ids[i] for i in np.argpartition(-exact_scores, k - 1)[:k])
+            exact_time += time.perf_counter() - start
+
+            start = time.perf_counter()
+            approx = self.search(query, top_k, rescore_factor=1)
+            approx_time += time.perf_counter() - start
+
+            start = time.perf_counter()
+            rescored = self.search(query, top_k, rescore_factor=rescore_factor, fetch_vectors=fetch)
+            rescored_time += time.perf_counter() - start
+
+            approx_hits += len(truth & {r['id'] for r in approx})
+            rescored_hits += len(truth & {r['id'] for r in rescored})
+
+        total = max(len(queries) * min(top_k, len(self.ids)), 1)
+        num_queries = max(len(queries), 1)
+        return {
+            'mode': self.mode,
+            'vectors': len(self.ids),
+            'dimension': self.dimension,
+            'float32_bytes': int(full.nbytes),
+            'quantized_bytes': self.memory_bytes(),
+            'compression_ratio': round(full.nbytes / max(self.memory_bytes(), 1), 1),
+            'recall_at_k': round(approx_hits / total, 4),
+            'rescored_recall_at_k': round(rescored_hits / total, 4),
+            'exact_ms_per_query': round(1000 * exact_time / num_queries, 3),
+            'quantized_ms_per_query': round(1000 * approx_time / num_queries, 3),
+            'rescored_ms_per_query': round(1000 * rescored_time / num_queries, 3)
+        }
+
+
+if __name__ == "__main__":
+    # Compare quantized and exact search over the vectors in the live index
+    import argparse
+    from app.vector_store import get_vector_store
+
+    parser = argparse.ArgumentParser(description="Report recall loss of quantized search")
+    parser.add_argument('--mode', choices=QUANTIZATION_MODES, default='int8')
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--queries', type=int, default=50, help="Stored vectors held out of the index and used as queries")
+    args = parser.parse_args()
+
+    vector_store = get_vector_store()
+    ids, vectors, _ = vector_store.fetch_all_vectors()
+    if len(ids) <= args.queries:
+        parser.error(f"Need more than {args.queries} vectors, index has {len(ids)}")
+
+    # Hold the query vectors out so no query can match itself
+    queries = vectors[:args.queries]
+    index = QuantizedIndex(vector_store.dimension, args.mode)
+    index.add(ids[args.queries:], vectors[args.queries:])
+
+    report = index.compare(vectors[args.queries:], queries, top_k=args.top_k)
+    for key, value in report.items():
+        print(f"{key}: {value}")
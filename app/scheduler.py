@@ -0,0 +1,217 @@
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, Optional
+from app.config import settings
+
+# Session the current request is running for (set by the chatbot per call)
+current_session: ContextVar[str] = ContextVar('llm_session', default='default')
+
+
+class SchedulerOverloaded(Exception):
+    """Raised when a call is shed instead of queued. retry_after is in seconds."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Ticket:
+    __slots__ = ('enqueued_at', 'granted')
+
+    def __init__(self):
+        self.enqueued_at = time.monotonic()
+        self.granted = False
+
+
+class LLMScheduler:
+    """
+    Admission control for upstream model calls.
+
+    Caps global in-flight calls. Callers beyond the cap wait in per-session
+    queues that are served round-robin, so one busy session cannot starve
+    the rest. Calls are shed with SchedulerOverloaded when the queue is full
+    or the expected wait would exceed the deadline.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        max_queue: int,
+        max_queue_per_session: int,
+        max_wait: float
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.max_queue_per_session = max_queue_per_session
+        self.max_wait = max_wait
+
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._queues: "OrderedDict[str, deque]" = OrderedDict()
+        self._queue_depth = 0
+        self._wait_times = deque(maxlen=500)
+        self._service_times = deque(maxlen=100)
+        self._admitted = 0
+        self._shed = 0
+
+    def _estimated_wait(self, position: int) -> float:
+        """Expected seconds until a caller at this queue position is admitted"""
+        if not self._service_times:
+            # No history yet: rely on the queue timeout alone
+            return 0.0
+        avg_service = sum(self._service_times) / len(self._service_times)
+        return avg_service * position / self.max_in_flight
+
+    def _reject(self, reason: str, position: int):
+        self._shed += 1
+        retry_after = max(1.0, self._estimated_wait(position))
+        raise SchedulerOverloaded(reason, retry_after)
+
+    def _dispatch(self):
+        """Grant free slots to waiting sessions in round-robin order"""
+        granted = False
+        while self._in_flight < self.max_in_flight and self._queues:
+            session_id, queue = next(iter(self._queues.items()))
+            ticket = queue.popleft()
+            if queue:
+                self._queues.move_to_end(session_id)
+            else:
+                del self._queues[session_id]
+            self._queue_depth -= 1
+            ticket.granted = True
+            self._in_flight += 1
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def _check_queue(self, session_id: str):
+        """Reject if a new waiter for session_id would be shed. Caller holds the lock."""
+        if self._queue_depth >= self.max_queue:
+            self._reject("Upstream queue is full", self._queue_depth + 1)
+        if len(self._queues.get(session_id, ())) >= self.max_queue_per_session:
+            self._reject("Too many queued requests for this session", self._queue_depth + 1)
+        if self._estimated_wait(self._queue_depth + 1) > self.max_wait:
+            self._reject("Expected queue wait exceeds deadline", self._queue_depth + 1)
+
+    def check_admission(self, session_id: Optional[str] = None):
+        """
+        Raise SchedulerOverloaded now if a call for session_id would be shed.
+
+        Lets async endpoints answer 429 before taking a worker thread that
+        would only wait in the queue to be rejected.
+        """
+        if session_id is None:
+            session_id = current_session.get()
+
+        with self._cond:
+            if self._in_flight < self.max_in_flight and not self._queues:
+                return
+            self._check_queue(session_id)
+
+    def acquire(self, session_id: Optional[str] = None, blocking: bool = True):
+        """Wait for a slot. Raises SchedulerOverloaded if the call is shed."""
+        if session_id is None:
+            session_id = current_session.get()
+
+        with self._cond:
+            if self._in_flight < self.max_in_flight and not self._queues:
+                self._in_flight += 1
+                self._admitted += 1
+                self._wait_times.append(0.0)
+                return
+
+            if not blocking:
+                self._reject("No free upstream capacity", self._queue_depth + 1)
+            self._check_queue(session_id)
+
+            ticket = _Ticket()
+            self._queues.setdefault(session_id, deque()).append(ticket)
+            self._queue_depth += 1
+            deadline = ticket.enqueued_at + self.max_wait
+
+            while not ticket.granted:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    queue = self._queues.get(session_id)
+                    queue.remove(ticket)
+                    if not queue:
+                        del self._queues[session_id]
+                    self._queue_depth -= 1
+                    self._reject("Timed out waiting for upstream capacity", self._queue_depth + 1)
+                self._cond.wait(remaining)
+
+            self._admitted += 1
+            self._wait_times.append(time.monotonic() - ticket.enqueued_at)
+
+    def has_capacity(self, headroom: int = 0) -> bool:
+        """True if a call would be admitted now with `headroom` slots to spare"""
+        with self._cond:
+            return not self._queues and self._in_flight + headroom < self.max_in_flight
+
+    def release(self, service_time: float):
+        with self._cond:
+            self._in_flight -= 1
+            self._service_times.append(service_time)
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, session_id: Optional[str] = None, blocking: bool = True):
+        """Hold one upstream slot for the duration of the block"""
+        self.acquire(session_id, blocking)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - start)
+
+    @contextmanager
+    def session(self, session_id: str):
+        """Attribute upstream calls made inside the block to session_id"""
+        token = current_session.set(session_id)
+        try:
+            yield
+        finally:
+            current_session.reset(token)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            waits = sorted(self._wait_times)
+            services = list(self._service_times)
+            in_flight = self._in_flight
+            queue_depth = self._queue_depth
+            sessions_waiting = len(self._queues)
+            admitted = self._admitted
+            shed = self._shed
+
+        def percentile(p):
+            if not waits:
+                return 0.0
+            return round(1000 * waits[min(len(waits) - 1, math.ceil(p * len(waits)) - 1)], 1)
+
+        return {
+            'in_flight': in_flight,
+            'max_in_flight': self.max_in_flight,
+            'queue_depth': queue_depth,
+            'max_queue': self.max_queue,
+            'sessions_waiting': sessions_waiting,
+            'admitted_total': admitted,
+            'shed_total': shed,
+            'wait_ms_p50': percentile(0.50),
+            'wait_ms_p95': percentile(0.95),
+            'wait_ms_max': round(1000 * waits[-1], 1) if waits else 0.0,
+            'avg_service_ms': round(1000 * sum(services) / len(services), 1) if services else 0.0
+        }
+
+
+# Global instance shared by chat completions and embeddings
+llm_scheduler = LLMScheduler(
+    max_in_flight=settings.LLM_MAX_CONCURRENCY,
+    max_queue=settings.LLM_MAX_QUEUE,
+    max_queue_per_session=settings.LLM_MAX_QUEUE_PER_SESSION,
+    max_wait=settings.LLM_QUEUE_TIMEOUT
+)
@@ -0,0 +1,196 @@
+"""
+Index snapshot export/import.
+
+A snapshot is an .npz-compatible zip archive written in streamed chunks:
+
+    manifest.npy                JSON string: index name, dimension, chunk list
+    ids_00000.npy               uint8 blob of UTF-8 encoded vector IDs
+    ids_00000_offsets.npy       int64 offsets (n + 1) of each ID in the blob
+    vectors_00000.npy           float32 array (n, dimension)
+    metadata_00000.npy          uint8 blob of UTF-8 JSON-encoded metadata
+    metadata_00000_offsets.npy  int64 offsets (n + 1) of each record in the blob
+
+It can be inspected with numpy.load(path), and restored without
+re-embedding anything.
+
+Usage:
+    python -m app.snapshot export neo-knowledge.npz
+    python -m app.snapshot import neo-knowledge.npz --concurrency 8
+"""
+import argparse
+import json
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+from app.config import settings
+
+# Vectors per chunk written to the archive
+SNAPSHOT_CHUNK_SIZE = 2000
+# Vectors per upsert request on import
+UPSERT_BATCH_SIZE = 100
+# Archive layout version, bumped on incompatible changes
+SNAPSHOT_FORMAT = 1
+
+
+def _write_array(zf: zipfile.ZipFile, name: str, array: np.ndarray):
+    with zf.open(f"{name}.npy", 'w', force_zip64=True) as f:
+        np.lib.format.write_array(f, array, allow_pickle=False)
+
+
+def _read_array(zf: zipfile.ZipFile, name: str) -> np.ndarray:
+    with zf.open(f"{name}.npy") as f:
+        return np.lib.format.read_array(f, allow_pickle=False)
+
+
+def _write_strings(zf: zipfile.ZipFile, name: str, strings: List[str]):
+    """Store strings as one UTF-8 blob plus offsets (unicode arrays pad every row to the longest)"""
+    encoded = [value.encode('utf-8') for value in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    _write_array(zf, name, np.frombuffer(b''.join(encoded), dtype=np.uint8))
+    _write_array(zf, f"{name}_offsets", offsets)
+
+
+def _read_strings(zf: zipfile.ZipFile, name: str) -> List[str]:
+    blob = _read_array(zf, name).tobytes()
+    offsets = _read_array(zf, f"{name}_offsets")
+    return [blob[start:end].decode('utf-8') for start, end in zip(offsets[:-1], offsets[1:])]
+
+
+def export_snapshot(vector_store, path: str, namespaces: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Stream every vector (IDs, values, metadata) in the given namespaces to a snapshot file"""
+    if namespaces is None:
+        namespaces = vector_store.list_namespaces() or [settings.PINECONE_NAMESPACE]
+
+    start_time = time.time()
+    chunks = []
+    total = 0
+
+    with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=1) as zf:
+
+        def flush(namespace, ids, vectors, metadata):
+            name = f"{len(chunks):05d}"
+            _write_strings(zf, f"ids_{name}", ids)
+            _write_array(zf, f"vectors_{name}", np.asarray(vectors, dtype=np.float32))
+            _write_strings(zf, f"metadata_{name}", [json.dumps(m) for m in metadata])
+            chunks.append({'name': name, 'namespace': namespace, 'count': len(ids)})
+
+        for namespace in namespaces:
+            ids, vectors, metadata = [], [], []
+            for page_ids, page_vectors, page_metadata in vector_store.iter_vectors(namespace):
+                ids.extend(page_ids)
+                vectors.extend(page_vectors)
+                metadata.extend(page_metadata)
+                if len(ids) >= SNAPSHOT_CHUNK_SIZE:
+                    flush(namespace, ids, vectors, metadata)
+                    total += len(ids)
+                    print(f"Exported {total} vectors...")
+                    ids, vectors, metadata = [], [], []
+            if ids:
+                flush(namespace, ids, vectors, metadata)
+                total += len(ids)
+
+        manifest = {
+            'format': SNAPSHOT_FORMAT,
+            'index_name': vector_store.index_name,
+            'dimension': vector_store.dimension,
+            'embedding_model': settings.EMBEDDING_MODEL,
+            'created_at': int(time.time()),
+            'total_vectors': total,
+            'chunks': chunks
+        }
+        _write_array(zf, 'manifest', np.array(json.dumps(manifest)))
+
+    elapsed = time.time() - start_time
+    print(f"Exported {total} vectors from {len(namespaces)} namespace(s) to {path} in {elapsed:.1f}s")
+    return manifest
+
+
+def read_manifest(path: str) -> Dict[str, Any]:
+    with zipfile.ZipFile(path) as zf:
+        return json.loads(str(_read_array(zf, 'manifest')))
+
+
+def import_snapshot(
+    vector_store,
+    path: str,
+    namespace: Optional[str] = None,
+    concurrency: int = 8
+) -> Dict[str, Any]:
+    """
+    Bulk-upsert a snapshot back into the index.
+
+    namespace overrides the namespaces recorded in the snapshot.
+    """
+    start_time = time.time()
+    total = 0
+
+    with zipfile.ZipFile(path) as zf:
+        manifest = json.loads(str(_read_array(zf, 'manifest')))
+        if manifest.get('format') != SNAPSHOT_FORMAT:
+            raise ValueError(f"Unsupported snapshot format {manifest.get('format')}, expected {SNAPSHOT_FORMAT}")
+        if manifest['dimension'] != vector_store.dimension:
+            raise ValueError(
+                f"Snapshot dimension {manifest['dimension']} does not match "
+                f"index dimension {vector_store.dimension}"
+            )
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for chunk in manifest['chunks']:
+                ids = _read_strings(zf, f"ids_{chunk['name']}")
+                vectors = _read_array(zf, f"vectors_{chunk['name']}")
+                metadata = _read_strings(zf, f"metadata_{chunk['name']}")
+                target = namespace if namespace is not None else chunk['namespace']
+
+                records = [
+                    {'id': vector_id, 'values': values.tolist(), 'metadata': json.loads(meta)}
+                    for vector_id, values, meta in zip(ids, vectors, metadata)
+                ]
+                # Upsert batches in parallel; wait per chunk to bound memory
+                futures = [
+                    pool.submit(vector_store.index.upsert, vectors=records[i:i + UPSERT_BATCH_SIZE], namespace=target)
+                    for i in range(0, len(records), UPSERT_BATCH_SIZE)
+                ]
+                for future in futures:
+                    future.result()
+
+                vector_store.invalidate_local_index(target)
+                total += len(records)
+                elapsed = max(time.time() - start_time, 1e-6)
+                print(f"Imported {total}/{manifest['total_vectors']} vectors ({total / elapsed:.0f} vectors/s)")
+
+    elapsed = time.time() - start_time
+    print(f"Imported {total} vectors from {path} in {elapsed:.1f}s")
+    return {'vectors': total, 'seconds': round(elapsed, 1)}
+
+
+def main():
+    from app.vector_store import get_vector_store
+
+    parser = argparse.ArgumentParser(description="Export or import a vector index snapshot")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = subparsers.add_parser('export', help="Write the index to a snapshot file")
+    export_parser.add_argument('path')
+    export_parser.add_argument('--namespace', action='append', help="Namespace to export (repeatable, default: all)")
+
+    import_parser = subparsers.add_parser('import', help="Restore a snapshot file into the index")
+    import_parser.add_argument('path')
+    import_parser.add_argument('--namespace', help="Restore every vector into this namespace")
+    import_parser.add_argument('--concurrency', type=int, default=8, help="Concurrent upsert requests")
+
+    args = parser.parse_args()
+    vector_store = get_vector_store()
+
+    if args.command == 'export':
+        export_snapshot(vector_store, args.path, args.namespace)
+    else:
+        import_snapshot(vector_store, args.path, args.namespace, args.concurrency)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""
+Precompressed, content-hashed static asset serving.
+
+The build step (python -m app.static_assets) writes static/dist/:
+    neo-logo.<hash>.png         assets copied under content-hashed names
+    index.html                  HTML shells with asset URLs rewritten to hashed names
+    index.html.gz / .br         gzip and brotli variants of compressible files
+    manifest.json               original name -> hashed name, plus source hashes
+
+At runtime hashed assets are served with immutable cache headers, HTML
+shells with ETag revalidation (304), and small files straight from memory.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import re
+import shutil
+from pathlib import Path
+from typing import Dict, Any, Optional, Set
+
+from fastapi import Request, HTTPException
+from fastapi.responses import Response, FileResponse
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; gzip variants are always built
+    brotli = None
+
+HTML_SHELLS = ['index.html', 'chat.html', 'admin.html']
+# Images and audio are already compressed, so only text formats get variants
+COMPRESSIBLE_SUFFIXES = {'.html', '.css', '.js', '.svg', '.json', '.txt', '.map'}
+# Files up to this size are held in memory after the first load
+IN_MEMORY_LIMIT = 256 * 1024
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+DEFAULT_CACHE = "public, max-age=3600"
+
+_ASSET_URL = re.compile(r'/static/([\w.-]+)')
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _write_variants(path: Path, data: bytes):
+    """Write gzip (and brotli, if installed) variants next to path"""
+    path.with_name(path.name + '.gz').write_bytes(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        path.with_name(path.name + '.br').write_bytes(brotli.compress(data, quality=11))
+
+
+def _source_hashes(static_dir: Path) -> Dict[str, str]:
+    return {
+        path.name: _sha256(path.read_bytes())
+        for path in sorted(static_dir.iterdir())
+        if path.is_file()
+    }
+
+
+def build(static_dir: Path, dist_dir: Path) -> Dict[str, Any]:
+    """Build hashed, precompressed assets from static_dir into dist_dir"""
+    if dist_dir.exists():
+        shutil.rmtree(dist_dir)
+    dist_dir.mkdir(parents=True)
+
+    sources = _source_hashes(static_dir)
+    assets = {}
+
+    for name, digest in sources.items():
+        if name in HTML_SHELLS:
+            continue
+        source = static_dir / name
+        hashed_name = f"{source.stem}.{digest[:10]}{source.suffix}"
+        target = dist_dir / hashed_name
+        shutil.copyfile(source, target)
+        if source.suffix.lower() in COMPRESSIBLE_SUFFIXES:
+            _write_variants(target, target.read_bytes())
+        assets[name] = hashed_name
+
+    def rewrite(match):
+        hashed_name = assets.get(match.group(1))
+        return f"/static/{hashed_name}" if hashed_name else match.group(0)
+
+    for name in HTML_SHELLS:
+        source = static_dir / name
+        if not source.exists():
+            continue
+        html = _ASSET_URL.sub(rewrite, source.read_text(encoding='utf-8')).encode('utf-8')
+        target = dist_dir / name
+        target.write_bytes(html)
+        _write_variants(target, html)
+
+    manifest = {'assets': assets, 'sources': sources, 'brotli': brotli is not None}
+    with open(dist_dir / 'manifest.json', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+    print(f"Built {len(assets)} hashed assets and {len(HTML_SHELLS)} HTML shells into {dist_dir}")
+    return manifest
+
+
+def _accepted_encodings(header: Optional[str]) -> Set[str]:
+    """Parse Accept-Encoding into the set of encodings with a non-zero q value"""
+    accepted = set()
+    for part in (header or '').split(','):
+        fields = [field.strip() for field in part.split(';')]
+        if not fields[0]:
+            continue
+        q = 1.0
+        for param in fields[1:]:
+            if param.startswith('q='):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            accepted.add(fields[0].lower())
+    return accepted
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get('if-none-match')
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(',')]
+    return '*' in tags or etag in tags or f"W/{etag}" in tags
+
+
+class StaticAssets:
+    """Serves the build output with caching headers, compression negotiation and 304s"""
+
+    def __init__(self, static_dir: Path, dist_dir: Path):
+        self.static_dir = static_dir
+        self.dist_dir = dist_dir
+        self.manifest: Dict[str, Any] = {'assets': {}, 'sources': {}}
+        self.hashed_names: Set[str] = set()
+        self.etags: Dict[str, str] = {}
+        self._memory: Dict[Path, bytes] = {}
+
+    def load(self):
+        """Load the build manifest, rebuilding first if it is missing or stale"""
+        manifest_path = self.dist_dir / 'manifest.json'
+        manifest = None
+        if manifest_path.exists():
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+
+        if manifest is None or manifest.get('sources') != _source_hashes(self.static_dir):
+            try:
+                manifest = build(self.static_dir, self.dist_dir)
+            except OSError as e:
+                # Read-only filesystem etc. - serve originals without hashing
+                print(f"Could not build static assets, serving originals: {e}")
+                manifest = None
+
+        if manifest is None:
+            self.dist_dir = self.static_dir
+            manifest = {'assets': {}, 'sources': _source_hashes(self.static_dir)}
+
+        self.manifest = manifest
+        self.hashed_names = set(manifest['assets'].values())
+        self._memory.clear()
+
+        # ETags come from content hashes: hashed assets by source hash, HTML by built bytes
+        self.etags = {}
+        for name, hashed_name in manifest['assets'].items():
+            self.etags[hashed_name] = f'"{manifest["sources"][name][:16]}"'
+        for name in HTML_SHELLS:
+            path = self.dist_dir / name
+            if path.exists():
+                self.etags[name] = f'"{_sha256(path.read_bytes())[:16]}"'
+
+    def _read(self, path: Path) -> bytes:
+        data = self._memory.get(path)
+        if data is None:
+            data = path.read_bytes()
+            self._memory[path] = data
+        return data
+
+    def _respond(self, request: Request, path: Path, etag: Optional[str], cache_control: str) -> Response:
+        headers = {'Cache-Control': cache_control, 'Vary': 'Accept-Encoding'}
+        # Starlette appends the charset for text/* types itself
+        media_type = mimetypes.guess_type(path.name)[0] or 'application/octet-stream'
+
+        # Prefer a precompressed variant the client accepts
+        accepted = _accepted_encodings(request.headers.get('accept-encoding'))
+        for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+            variant = path.with_name(path.name + suffix)
+            if encoding in accepted and variant.exists():
+                path = variant
+                headers['Content-Encoding'] = encoding
+                if etag:
+                    # Each encoding is a different representation and needs its own strong ETag
+                    etag = f'{etag[:-1]}-{suffix[1:]}"'
+                break
+
+        if etag:
+            headers['ETag'] = etag
+            if _etag_matches(request, etag):
+                return Response(status_code=304, headers=headers)
+
+        if path.stat().st_size <= IN_MEMORY_LIMIT:
+            return Response(content=self._read(path), media_type=media_type, headers=headers)
+        return FileResponse(path, media_type=media_type, headers=headers)
+
+    def html(self, request: Request, name: str) -> Response:
+        """Serve an HTML shell; clients revalidate every load and get 304 if unchanged"""
+        return self._respond(request, self.dist_dir / name, self.etags.get(name), REVALIDATE_CACHE)
+
+    def asset(self, request: Request, name: str) -> Response:
+        """Serve /static/<name>: hashed names are immutable, originals get a short max-age"""
+        if name in self.hashed_names:
+            return self._respond(request, self.dist_dir / name, self.etags.get(name), IMMUTABLE_CACHE)
+
+        path = (self.static_dir / name).resolve()
+        if path.parent != self.static_dir.resolve() or not path.is_file():
+            raise HTTPException(status_code=404, detail="Not found")
+
+        digest = self.manifest['sources'].get(name)
+        etag = f'"{digest[:16]}"' if digest else None
+        return self._respond(request, path, etag, DEFAULT_CACHE)
+
+
+if __name__ == "__main__":
+    base_dir = Path(__file__).resolve().parent.parent
+    build(base_dir / "static", base_dir / "static" / "dist")
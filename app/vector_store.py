@@ -1,12 +1,25 @@
 from pinecone import Pinecone, ServerlessSpec
 from openai import OpenAI
 from app.config import settings
+from app.quantization import QuantizedIndex
+from app.scheduler import llm_scheduler
+import threading
 import time
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+from contextlib import nullcontext
 import hashlib
 
+# Local quantized indexes shared by all VectorStore instances, keyed by
+# (index name, namespace, mode) -> {'index', 'built_at', 'invalidated_at', 'building'}.
+# The lock only guards this dict; indexes are built in background threads.
+_local_indexes: Dict[tuple, Dict[str, Any]] = {}
+_local_indexes_lock = threading.Lock()
+
 class VectorStore:
-    def __init__(self):
+    def __init__(self, scheduled: bool = True):
+        # Web requests share upstream capacity through llm_scheduler; offline
+        # tools (bulk ingest) pass scheduled=False and bound their own concurrency
+        self.scheduled = scheduled
         self.pc = Pinecone(api_key=settings.PINECONE_API_KEY)
         # Use OpenRouter for embeddings
         self.openai_client = OpenAI(
@@ -14,6 +27,7 @@ class VectorStore:
             base_url="https://openrouter.ai/api/v1"
         )
         self.index_name = settings.PINECONE_INDEX_NAME
+        self.dimension = settings.EMBEDDING_DIMENSION
         self.index = None
         self._initialize_index()
 
@@ -25,7 +39,7 @@ class VectorStore:
             print(f"Creating new index: {self.index_name}")
             self.pc.create_index(
                 name=self.index_name,
-                dimension=1536,  # text-embedding-3-small dimension
+                dimension=self.dimension,
                 metric='cosine',
                 spec=ServerlessSpec(
                     cloud='aws',
@@ -40,64 +54,141 @@ class VectorStore:
         index_info = self.pc.describe_index(self.index_name)
         index_host = index_info.host
 
+        if index_info.dimension != self.dimension:
+            raise ValueError(
+                f"Index {self.index_name} has dimension {index_info.dimension}, "
+                f"but EMBEDDING_DIMENSION is {self.dimension}"
+            )
+
         # Connect using host URL instead of name
         self.index = self.pc.Index(host=index_host)
         print(f"Connected to index: {self.index_name} (host: {index_host})")
 
-    def create_embedding(self, text: str) -> List[float]:
+    def create_embedding(self, text: str, dimension: Optional[int] = None, blocking: bool = True) -> List[float]:
         """Create embedding using OpenRouter"""
-        response = self.openai_client.embeddings.create(
-            input=text,
-            model=settings.EMBEDDING_MODEL
-        )
-        return response.data[0].embedding
+        return self.create_embeddings([text], dimension, blocking)[0]
 
-    def add_documents(self, chunks: List[Dict[str, Any]], document_name: str):
-        """Add document chunks to Pinecone"""
-        vectors = []
+    def create_embeddings(
+        self,
+        texts: List[str],
+        dimension: Optional[int] = None,
+        blocking: bool = True
+    ) -> List[List[float]]:
+        """
+        Create embeddings for a batch of texts in a single request.
+        With blocking=False, raises SchedulerOverloaded instead of queueing
+        (scheduled instances only).
+        """
+        if dimension is None:
+            dimension = self.dimension
 
-        for i, chunk in enumerate(chunks):
-            # Create unique ID for each chunk
-            chunk_id = hashlib.md5(f"{document_name}_{i}_{chunk['text'][:50]}".encode()).hexdigest()
+        kwargs = {}
+        # Only text-embedding-3-* models support shortened embeddings
+        if settings.EMBEDDING_MODEL.startswith("text-embedding-3"):
+            kwargs['dimensions'] = dimension
 
-            # Create embedding
-            embedding = self.create_embedding(chunk['text'])
+        slot = llm_scheduler.slot(blocking=blocking) if self.scheduled else nullcontext()
+        with slot:
+            response = self.openai_client.embeddings.create(
+                input=texts,
+                model=settings.EMBEDDING_MODEL,
+                **kwargs
+            )
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
 
-            # Prepare metadata
-            metadata = {
-                'text': chunk['text'],
-                'document_name': document_name,
-                'chunk_index': i,
-                **chunk.get('metadata', {})
-            }
+    def build_vector(
+        self,
+        chunk: Dict[str, Any],
+        document_name: str,
+        chunk_index: int,
+        embedding: List[float],
+        ingested_at: int
+    ) -> Dict[str, Any]:
+        """Build a Pinecone vector record for one chunk"""
+        # Create unique ID for each chunk
+        chunk_id = hashlib.md5(f"{document_name}_{chunk_index}_{chunk['text'][:50]}".encode()).hexdigest()
 
-            vectors.append({
-                'id': chunk_id,
-                'values': embedding,
-                'metadata': metadata
-            })
+        # Prepare metadata
+        metadata = {
+            'text': chunk['text'],
+            'document_name': document_name,
+            'chunk_index': chunk_index,
+            'ingested_at': ingested_at,
+            **chunk.get('metadata', {})
+        }
+
+        return {
+            'id': chunk_id,
+            'values': embedding,
+            'metadata': metadata
+        }
+
+    def upsert_vectors(self, vectors: List[Dict[str, Any]], namespace: Optional[str] = None):
+        """Upsert vector records in batches of 100"""
+        if namespace is None:
+            namespace = settings.PINECONE_NAMESPACE
 
-        # Upsert in batches of 100
         batch_size = 100
         for i in range(0, len(vectors), batch_size):
             batch = vectors[i:i + batch_size]
-            self.index.upsert(vectors=batch)
+            self.index.upsert(vectors=batch, namespace=namespace)
+
+        self.invalidate_local_index(namespace)
 
-        print(f"Added {len(vectors)} chunks from {document_name} to Pinecone")
+    def add_documents(self, chunks: List[Dict[str, Any]], document_name: str, namespace: Optional[str] = None):
+        """Add document chunks to Pinecone"""
+        if namespace is None:
+            namespace = settings.PINECONE_NAMESPACE
+
+        vectors = []
+        ingested_at = int(time.time())
+        batch_size = settings.EMBEDDING_BATCH_SIZE
+
+        # Embed in batches instead of one request per chunk
+        for start in range(0, len(chunks), batch_size):
+            batch = chunks[start:start + batch_size]
+            embeddings = self.create_embeddings([chunk['text'] for chunk in batch])
+            for offset, (chunk, embedding) in enumerate(zip(batch, embeddings)):
+                vectors.append(self.build_vector(chunk, document_name, start + offset, embedding, ingested_at))
+
+        self.upsert_vectors(vectors, namespace)
+
+        print(f"Added {len(vectors)} chunks from {document_name} to Pinecone (namespace: '{namespace}')")
         return len(vectors)
 
-    def search(self, query: str, top_k: int = None) -> List[Dict[str, Any]]:
-        """Search for relevant documents"""
+    def search(
+        self,
+        query: str,
+        top_k: int = None,
+        namespace: Optional[str] = None,
+        filter: Optional[Dict[str, Any]] = None,
+        blocking: bool = True
+    ) -> List[Dict[str, Any]]:
+        """
+        Search for relevant documents, optionally scoped to a namespace and metadata filter.
+        blocking=False never queues for an embedding slot (used for speculative searches).
+        """
         if top_k is None:
             top_k = settings.TOP_K_RESULTS
+        if namespace is None:
+            namespace = settings.PINECONE_NAMESPACE
+
+        # Metadata filters are only supported by Pinecone. Speculative (non-blocking)
+        # searches may use a cached index but never start a rebuild.
+        if settings.LOCAL_VECTOR_SEARCH and not filter:
+            local_index = self.get_local_index(namespace, refresh=blocking)
+            if local_index is not None:
+                return self.search_quantized(local_index, query, top_k, namespace, blocking)
 
         # Create query embedding
-        query_embedding = self.create_embedding(query)
+        query_embedding = self.create_embedding(query, blocking=blocking)
 
         # Search Pinecone
         results = self.index.query(
             vector=query_embedding,
             top_k=top_k,
+            namespace=namespace,
+            filter=filter or None,
             include_metadata=True
         )
 
@@ -113,6 +204,154 @@ class VectorStore:
 
         return formatted_results
 
+    def fetch_vectors(self, ids: List[str], namespace: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """Fetch full-precision vectors and metadata by ID (used for exact rescoring)"""
+        if namespace is None:
+            namespace = settings.PINECONE_NAMESPACE
+
+        vectors = {}
+        # Fetch in batches of 100 to keep request URLs short
+        for i in range(0, len(ids), 100):
+            response = self.index.fetch(ids=ids[i:i + 100], namespace=namespace)
+            for vector_id, vector in response.vectors.items():
+                vectors[vector_id] = {'values': vector.values, 'metadata': dict(vector.metadata or {})}
+        return vectors
+
+    def iter_vectors(self, namespace: Optional[str] = None):
+        """Yield (ids, vectors, metadata) one page at a time for every vector in a namespace"""
+        if namespace is None:
+            namespace = settings.PINECONE_NAMESPACE
+
+        for id_batch in self.index.list(namespace=namespace):
+            response = self.index.fetch(ids=list(id_batch), namespace=namespace)
+            ids, vectors, metadata = [], [], []
+            for vector_id, vector in response.vectors.items():
+                ids.append(vector_id)
+                vectors.append(vector.values)
+                metadata.append(dict(vector.metadata or {}))
+            yield ids, vectors, metadata
+
+    def fetch_all_vectors(self, namespace: Optional[str] = None):
+        """Return (ids, vectors, metadata) for every vector in a namespace"""
+        ids, vectors, metadata = [], [], []
+        for page_ids, page_vectors, page_metadata in self.iter_vectors(namespace):
+            ids.extend(page_ids)
+            vectors.extend(page_vectors)
+            metadata.extend(page_metadata)
+        return ids, vectors, metadata
+
+    def list_namespaces(self) -> List[str]:
+        """Namespaces that currently hold vectors"""
+        stats = self.index.describe_index_stats()
+        if hasattr(stats, 'namespaces') and stats.namespaces:
+            return list(stats.namespaces.keys())
+        return []
+
+    def build_quantized_index(self, mode: str = None, namespace: Optional[str] = None) -> QuantizedIndex:
+        """Load a namespace into a compact local QuantizedIndex"""
+        if mode is None:
+            mode = settings.VECTOR_QUANTIZATION
+
+        local_index = QuantizedIndex(self.dimension, mode)
+        # Add page by page so metadata is never held for the whole namespace
+        for ids, vectors, _ in self.iter_vectors(namespace):
+            if ids:
+                local_index.add(ids, vectors)
+
+        print(f"Built {mode} index with {len(local_index)} vectors "
+              f"({local_index.memory_bytes()} bytes)")
+        return local_index
+
+    def get_local_index(self, namespace: Optional[str] = None, refresh: bool = True) -> Optional[QuantizedIndex]:
+        """
+        Return the cached local index for a namespace, or None if none is built yet.
+
+        A missing or stale index is rebuilt in a background thread (one per
+        namespace); until it finishes, the stale index keeps serving and a
+        missing one means the caller falls back to Pinecone. refresh=False
+        never starts a rebuild.
+        """
+        if namespace is None:
+            namespace = settings.PINECONE_NAMESPACE
+
+        key = (self.index_name, namespace, settings.VECTOR_QUANTIZATION)
+        now = time.time()
+        with _local_indexes_lock:
+            entry = _local_indexes.setdefault(
+                key, {'index': None, 'built_at': 0.0, 'invalidated_at': 0.0, 'building': False}
+            )
+            stale = (
+                entry['index'] is None
+                or entry['built_at'] < entry['invalidated_at']
+                or now - entry['built_at'] > settings.LOCAL_INDEX_MAX_AGE
+            )
+            start_build = refresh and stale and not entry['building']
+            if start_build:
+                entry['building'] = True
+            local_index = entry['index']
+
+        if start_build:
+            threading.Thread(target=self._rebuild_local_index, args=(key,), daemon=True).start()
+        return local_index
+
+    def _rebuild_local_index(self, key: tuple):
+        """Build a fresh local index for a cache key and swap it in"""
+        _, namespace, mode = key
+        started_at = time.time()
+        try:
+            local_index = self.build_quantized_index(mode=mode, namespace=namespace)
+            with _local_indexes_lock:
+                _local_indexes[key].update(index=local_index, built_at=started_at)
+        except Exception as e:
+            print(f"Error building local index for namespace '{namespace}': {e}")
+        finally:
+            with _local_indexes_lock:
+                _local_indexes[key]['building'] = False
+
+    def invalidate_local_index(self, namespace: Optional[str] = None):
+        """Mark cached local indexes for a namespace stale after its vectors change"""
+        if namespace is None:
+            namespace = settings.PINECONE_NAMESPACE
+
+        now = time.time()
+        with _local_indexes_lock:
+            for key, entry in _local_indexes.items():
+                if key[:2] == (self.index_name, namespace):
+                    entry['invalidated_at'] = now
+
+    def search_quantized(
+        self,
+        local_index: QuantizedIndex,
+        query: str,
+        top_k: int = None,
+        namespace: Optional[str] = None,
+        blocking: bool = True
+    ) -> List[Dict[str, Any]]:
+        """
+        Search a local QuantizedIndex, rescoring candidates with exact vectors from Pinecone.
+        The same fetch returns each match's text and metadata, which are not kept locally.
+        """
+        if top_k is None:
+            top_k = settings.TOP_K_RESULTS
+
+        query_embedding = self.create_embedding(query, blocking=blocking)
+        matches = local_index.search(
+            query_embedding,
+            top_k=top_k,
+            rescore_factor=settings.RESCORE_FACTOR,
+            fetch_vectors=lambda ids: self.fetch_vectors(ids, namespace)
+        )
+
+        return [
+            {
+                'text': match['metadata'].get('text', ''),
+                'document_name': match['metadata'].get('document_name', ''),
+                'score': match['score'],
+                'metadata': match['metadata']
+            }
+            for match in matches
+        ]
+
     def list_documents(self) -> dict:
         """List all unique documents in the index"""
         stats = self.index.describe_index_stats()
@@ -129,29 +368,28 @@ class VectorStore:
                 else:
                     namespaces_data[ns_name] = 0
 
-        # Get unique document names by querying with dummy vector
-        # Create a dummy query to fetch some results
+        # Get unique document names by querying each namespace with a dummy vector
         try:
-            dummy_query = [0.0] * 1536  # Empty embedding
-            results = self.index.query(
-                vector=dummy_query,
-                top_k=10000,  # Get many results to find all unique docs
-                include_metadata=True
-            )
-
-            # Extract unique document names
-            document_names = set()
+            dummy_query = [0.0] * self.dimension  # Empty embedding
             document_chunks = {}
-            for match in results.matches:
-                doc_name = match.metadata.get('document_name', 'Unknown')
-                document_names.add(doc_name)
-                # Count chunks per document
-                document_chunks[doc_name] = document_chunks.get(doc_name, 0) + 1
+            for namespace in (namespaces_data or {settings.PINECONE_NAMESPACE: 0}):
+                results = self.index.query(
+                    vector=dummy_query,
+                    top_k=10000,  # Get many results to find all unique docs
+                    namespace=namespace,
+                    include_metadata=True
+                )
+
+                # Count chunks per (namespace, document)
+                for match in results.matches:
+                    doc_name = match.metadata.get('document_name', 'Unknown')
+                    key = (namespace, doc_name)
+                    document_chunks[key] = document_chunks.get(key, 0) + 1
 
             # Convert to sorted list with chunk counts
             documents_list = [
-                {'name': name, 'chunks': document_chunks.get(name, 0)}
-                for name in sorted(document_names)
+                {'name': name, 'namespace': namespace, 'chunks': chunks}
+                for (namespace, name), chunks in sorted(document_chunks.items())
             ]
         except Exception as e:
             print(f"Error fetching document list: {e}")
@@ -172,10 +410,34 @@ class VectorStore:
         print(f"Delete operation for {document_name} - requires fetching IDs")
         # TODO: Implement proper deletion by querying and deleting matching IDs
 
-def get_vector_store():
+def build_metadata_filter(
+    document_name: Optional[str] = None,
+    file_type: Optional[str] = None,
+    ingested_after: Optional[int] = None,
+    ingested_before: Optional[int] = None
+) -> Optional[Dict[str, Any]]:
+    """Build a Pinecone metadata filter. Ingest bounds are Unix timestamps."""
+    conditions = {}
+    if document_name:
+        conditions['document_name'] = {'$eq': document_name}
+    if file_type:
+        conditions['file_type'] = {'$eq': file_type}
+
+    ingested = {}
+    if ingested_after is not None:
+        ingested['$gte'] = ingested_after
+    if ingested_before is not None:
+        ingested['$lte'] = ingested_before
+    if ingested:
+        conditions['ingested_at'] = ingested
+
+    return conditions or None
+
+def get_vector_store(scheduled: bool = True):
     """
     Create a fresh VectorStore instance each time.
     This ensures we always have the latest index connection,
     avoiding 'Malformed domain' errors when indexes are deleted/recreated.
+    Batch tools pass scheduled=False to bypass the web server's admission control.
     """
-    return VectorStore()
+    return VectorStore(scheduled=scheduled)
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Offline retrieval benchmark.
+
+Builds an index from a fixture corpus for each chunking / index
+configuration, runs the labeled query set and reports recall@k, MRR,
+query latency percentiles, index build time and memory. Embeddings come
+from a deterministic local hashing embedder, so no API keys are needed and
+results are reproducible. Chunking counts tokens with tiktoken's
+cl100k_base encoding, which tiktoken downloads on first use and caches;
+point TIKTOKEN_CACHE_DIR at a cached copy to run fully offline.
+
+Fixture sets (benchmarks/fixtures/<set>/corpus + queries.json):
+    handbook    five long runbooks (~2k tokens each), several chunks per document
+    briefs      six short case studies (~500 tokens each)
+
+A chunk is relevant to a query if it comes from the labeled document and
+contains the labeled answer phrase. Configurations where top_k is at least
+the number of chunks are skipped, since every chunk is returned and recall
+is 1.0 by construction.
+
+Usage (from the repository root):
+    python -m benchmarks.retrieval_benchmark
+    python -m benchmarks.retrieval_benchmark --fixtures briefs --chunk-sizes 128 256 --top-k 3 5 --indexes flat int8
+"""
+import argparse
+import hashlib
+import json
+import re
+import time
+from pathlib import Path
+from typing import List, Dict, Any
+
+import numpy as np
+
+from app.document_processor import DocumentProcessor
+from app.quantization import QuantizedIndex, QUANTIZATION_MODES
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+FIXTURE_SETS = ('handbook', 'briefs')
+INDEX_TYPES = ('flat',) + QUANTIZATION_MODES
+
+
+class HashingEmbedder:
+    """Deterministic bag-of-words embedder (unigrams + bigrams, signed feature hashing)"""
+
+    def __init__(self, dimension: int = 384):
+        self.dimension = dimension
+
+    def _features(self, text: str) -> List[str]:
+        words = re.findall(r"[a-z0-9]+", text.lower())
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        counts: Dict[str, int] = {}
+        for feature in self._features(text):
+            counts[feature] = counts.get(feature, 0) + 1
+
+        for feature, count in counts.items():
+            digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], 'little') % self.dimension
+            sign = 1.0 if digest[4] & 1 else -1.0
+            vector[bucket] += sign * (1.0 + np.log(count))
+
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class FlatIndex:
+    """Exact float32 brute-force index"""
+
+    def __init__(self, dimension: int):
+        self.vectors = np.zeros((0, dimension), dtype=np.float32)
+
+    def add(self, vectors: np.ndarray):
+        self.vectors = np.concatenate([self.vectors, vectors])
+
+    def search(self, query: np.ndarray, top_k: int) -> List[int]:
+        scores = self.vectors @ query
+        top_k = min(top_k, len(scores))
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        return candidates[np.argsort(-scores[candidates])].tolist()
+
+    def memory_bytes(self) -> int:
+        return int(self.vectors.nbytes)
+
+
+def _normalize_text(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def load_fixtures(fixtures_dir: Path):
+    corpus = {path.name: path for path in sorted((fixtures_dir / "corpus").glob("*.md"))}
+    with open(fixtures_dir / "queries.json", 'r', encoding='utf-8') as f:
+        queries = json.load(f)
+    return corpus, queries
+
+
+def build_index(corpus: Dict[str, Path], chunk_size: int, overlap: int, index_type: str, embedder: HashingEmbedder):
+    """Chunk, embed and index the corpus. Returns (index, chunks, vectors, build_seconds)"""
+    start = time.perf_counter()
+    processor = DocumentProcessor(max_tokens=chunk_size, overlap_tokens=overlap)
+
+    chunks = []
+    for name, path in corpus.items():
+        for chunk in processor.chunk_text(processor.process_file(str(path), 'markdown')):
+            chunks.append({'document': name, 'text': chunk['text']})
+
+    vectors = np.stack([embedder.embed(chunk['text']) for chunk in chunks])
+
+    if index_type == 'flat':
+        index = FlatIndex(embedder.dimension)
+        index.add(vectors)
+    else:
+        index = QuantizedIndex(embedder.dimension, index_type)
+        index.add([str(i) for i in range(len(chunks))], vectors)
+
+    return index, chunks, vectors, time.perf_counter() - start
+
+
+def run_queries(index, index_type: str, chunks, vectors, queries, top_k: int, embedder: HashingEmbedder, repeat: int):
+    """Return (recall@k, MRR, latencies in ms) for one configuration"""
+    # Quantized indexes rescore with exact vectors; in production these are fetched from Pinecone
+    def fetch_vectors(ids):
+        return {i: {'values': vectors[int(i)]} for i in ids}
+
+    hits = 0
+    reciprocal_ranks = 0.0
+    latencies = []
+
+    for item in queries:
+        answer = _normalize_text(item['answer'])
+        relevant = {
+            i for i, chunk in enumerate(chunks)
+            if chunk['document'] == item['document'] and answer in _normalize_text(chunk['text'])
+        }
+
+        for _ in range(repeat):
+            start = time.perf_counter()
+            query_vector = embedder.embed(item['query'])
+            if index_type == 'flat':
+                ranked = index.search(query_vector, top_k)
+            else:
+                matches = index.search(
+                    query_vector,
+                    top_k,
+                    fetch_vectors=fetch_vectors
+                )
+                ranked = [int(match['id']) for match in matches]
+            latencies.append(1000 * (time.perf_counter() - start))
+
+        for rank, chunk_index in enumerate(ranked, 1):
+            if chunk_index in relevant:
+                hits += 1
+                reciprocal_ranks += 1.0 / rank
+                break
+
+    return hits / len(queries), reciprocal_ranks / len(queries), latencies
+
+
+def run_benchmark(
+    chunk_sizes: List[int],
+    overlap_ratio: float,
+    top_ks: List[int],
+    index_types: List[str],
+    dimension: int,
+    repeat: int,
+    fixtures_dir: Path = FIXTURES_DIR / "handbook"
+) -> List[Dict[str, Any]]:
+    corpus, queries = load_fixtures(fixtures_dir)
+    embedder = HashingEmbedder(dimension)
+    results = []
+    skipped = 0
+
+    for chunk_size in chunk_sizes:
+        overlap = int(chunk_size * overlap_ratio)
+        for index_type in index_types:
+            index, chunks, vectors, build_seconds = build_index(corpus, chunk_size, overlap, index_type, embedder)
+            for top_k in top_ks:
+                if top_k >= len(chunks):
+                    skipped += 1
+                    continue
+                recall, mrr, latencies = run_queries(index, index_type, chunks, vectors, queries, top_k, embedder, repeat)
+                results.append({
+                    'chunk_size': chunk_size,
+                    'overlap': overlap,
+                    'index': index_type,
+                    'top_k': top_k,
+                    'chunks': len(chunks),
+                    'recall@k': round(recall, 3),
+                    'mrr': round(mrr, 3),
+                    'p50_ms': round(float(np.percentile(latencies, 50)), 3),
+                    'p95_ms': round(float(np.percentile(latencies, 95)), 3),
+                    'p99_ms': round(float(np.percentile(latencies, 99)), 3),
+                    'build_s': round(build_seconds, 3),
+                    'index_bytes': index.memory_bytes(),
+                    'bytes_per_chunk': index.memory_bytes() // max(len(chunks), 1)
+                })
+
+    if skipped:
+        print(f"Skipped {skipped} configurations where top_k >= chunks (recall is 1.0 by construction)")
+    return results
+
+
+def print_table(results: List[Dict[str, Any]]):
+    if not results:
+        return
+    columns = list(results[0].keys())
+    widths = {c: max(len(c), *(len(str(r[c])) for r in results)) for c in columns}
+    print("  ".join(c.rjust(widths[c]) for c in columns))
+    for row in results:
+        print("  ".join(str(row[c]).rjust(widths[c]) for c in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark retrieval quality and latency across configurations")
+    parser.add_argument('--fixtures', choices=FIXTURE_SETS, default='handbook', help="Fixture corpus and query set")
+    parser.add_argument('--chunk-sizes', type=int, nargs='+', default=[64, 128, 256, 512, 1024, 2000], help="Chunk sizes in tokens")
+    parser.add_argument('--overlap-ratio', type=float, default=0.1, help="Overlap as a fraction of chunk size")
+    parser.add_argument('--top-k', type=int, nargs='+', default=[1, 3, 5, 10])
+    parser.add_argument('--indexes', nargs='+', choices=INDEX_TYPES, default=list(INDEX_TYPES))
+    parser.add_argument('--dimension', type=int, default=384, help="Local embedding dimension")
+    parser.add_argument('--repeat', type=int, default=5, help="Timed runs per query")
+    parser.add_argument('--json', help="Also write results to this JSON file")
+    args = parser.parse_args()
+
+    results = run_benchmark(
+        args.chunk_sizes, args.overlap_ratio, args.top_k, args.indexes, args.dimension, args.repeat,
+        FIXTURES_DIR / args.fixtures
+    )
+    print_table(results)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote {len(results)} results to {args.json}")
+
+
+if __name__ == "__main__":
+    main()